@@ -2,13 +2,19 @@ from flask import Flask, render_template, request, redirect, url_for, session, f
 from flask_sqlalchemy import SQLAlchemy
 from functools import wraps
 import json
+import os
 from datetime import datetime
 import queue
 import sqlite3
+import threading
+import click
 
 
 from flask_migrate import Migrate
 
+from search import init_search, rebuild_search, search, customer_history
+from forecast import DemandForecaster
+
 
 # ================================
 # APP SETUP
@@ -20,6 +26,11 @@ app.secret_key = "your_secret_key"
 app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///dinedesk.db"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# ---------- RESTAURANT TIMEZONE ----------
+# IANA name (e.g. "Europe/London") used to define service days and hours for
+# prep forecasts. Unset means the server's local time.
+app.config["RESTAURANT_TIMEZONE"] = os.environ.get("DINEDESK_TIMEZONE")
+
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)      # ✅ FIXED: Now app and db exist
 
@@ -96,6 +107,7 @@ init_db()
 # ---------- Auto-create DB + admin account ----------
 with app.app_context():
     db.create_all()
+    init_search(db)
     if not User.query.filter_by(username="admin").first():
         user = User(username="admin", password="1234")
         db.session.add(user)
@@ -122,6 +134,35 @@ orders = []        # real-time kitchen order list
 sse_queues = []    # connected SSE clients
 
 
+# ================================
+# PREP FORECASTS
+# ================================
+forecaster = DemandForecaster(app.config["RESTAURANT_TIMEZONE"])   # cached item demand, refreshed per request
+FORECAST_CACHE = os.path.join(app.instance_path, "forecast_cache.npz")
+
+
+def warm_forecaster():
+    """Load order history into the forecaster off the request path."""
+    with app.app_context():
+        forecaster.load(FORECAST_CACHE)
+        forecaster.refresh(db.session)
+        forecaster.save(FORECAST_CACHE)
+
+
+forecast_warmup = threading.Thread(target=warm_forecaster, daemon=True)
+forecast_warmup_lock = threading.Lock()
+
+
+@app.before_request
+def start_forecast_warmup():
+    # Started by the first request rather than on import, so CLI commands
+    # (db upgrade, prep-list) and the reloader's watcher process skip it.
+    if forecast_warmup.ident is None:
+        with forecast_warmup_lock:
+            if forecast_warmup.ident is None:
+                forecast_warmup.start()
+
+
 # ================================
 # ROUTES
 # ================================
@@ -215,6 +256,63 @@ def delete_reservation(id):
     return redirect(url_for("dashboard"))
 
 
+# ---------- SEARCH ----------
+@app.route("/search")
+@login_required
+def search_customers():
+    q = request.args.get("q", "")
+    limit = request.args.get("limit", 10)
+    return jsonify(search(db.session, q, limit))
+
+
+@app.route("/customers/history")
+@login_required
+def customer_history_view():
+    history = customer_history(
+        db.session,
+        email=request.args.get("email"),
+        phone=request.args.get("phone"),
+        name=request.args.get("name"),
+    )
+    if history is None:
+        return jsonify({"error": "Provide email, phone or name"}), 400
+    return jsonify(history)
+
+
+@app.cli.command("reindex-search")
+def reindex_search():
+    """Rebuild the reservation and order search indexes."""
+    rebuild_search(db)
+    print("Search index rebuilt")
+
+
+# ---------- PREP LIST ----------
+def parse_prep_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date() if value else None
+
+
+@app.route("/prep_list")
+@login_required
+def prep_list():
+    try:
+        day = parse_prep_date(request.args.get("date"))
+    except ValueError:
+        return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+    if not forecaster.ready and forecast_warmup.is_alive():
+        return jsonify({"error": "Forecast is still loading, try again shortly"}), 503
+    return jsonify(forecaster.prep_list(db.session, day))
+
+
+@app.cli.command("prep-list")
+@click.option("--date", "date_str", default=None, help="Local service day to forecast (YYYY-MM-DD), defaults to tomorrow.")
+def prep_list_command(date_str):
+    """Print forecast prep quantities per menu item."""
+    result = forecaster.prep_list(db.session, parse_prep_date(date_str))
+    print(f"Prep list for {result['date']}")
+    for item in result["items"]:
+        print(f"{item['prep']:>6}  {item['name']}")
+
+
 # ---------- MENU ----------
 @app.route("/menu")
 @login_required
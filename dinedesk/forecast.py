@@ -0,0 +1,306 @@
+import calendar
+import contextlib
+import math
+import os
+import tempfile
+import threading
+import zipfile
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy import text
+
+
+# ================================
+# ITEM DEMAND FORECASTING
+# ================================
+# Order history is held as an (items x hours) matrix starting on a Monday
+# 00:00, so reshaping to (items, weeks, 168) lines up every hour-of-week
+# slot. Hours and days are the restaurant's local wall clock, so a date is a
+# service day and dinner lands on the evening it was served. A forecast is an
+# exponentially weighted average of each slot over past weeks, scaled by how
+# demand moved over the same stretch a year earlier.
+
+HOURS_PER_WEEK = 168
+HALF_LIFE_WEEKS = 4        # weight of a week halves every 4 weeks of age
+BASELINE_WEEKS = 4         # lead-up window for the year-over-year factor
+SEASONAL_CLIP = (0.5, 2.0)
+SEASONAL_SMOOTHING = 1.0   # additive smoothing so rare items don't swing wildly
+
+# Flattens Order.items (JSON list of {name, quantity, price}) inside SQLite so
+# Python never iterates over orders. Grouping here is slower than np.add.at.
+# json_extract raises on non-object elements (e.g. ["Pizza"]), and one such
+# row would fail every refresh, so only objects are read.
+ORDER_ITEMS_SQL = """
+    SELECT CAST(strftime('%s', o.timestamp) AS INTEGER) AS seconds,
+           CAST(CASE WHEN j.type = 'object' THEN json_extract(j.value, '$.name') END AS TEXT) AS name,
+           CAST(coalesce(
+               CASE WHEN j.type = 'object' THEN json_extract(j.value, '$.quantity') END, 1
+           ) AS REAL) AS quantity
+    FROM "order" o, json_each(o.items) j
+    WHERE o.id > :last_id AND o.id <= :max_id
+      AND o.timestamp IS NOT NULL
+      AND json_valid(o.items)
+      AND name IS NOT NULL
+"""
+
+
+def _hour_index(dt):
+    """Hours since 1970-01-01 on `dt`'s own (naive, wall-clock) calendar."""
+    return calendar.timegm(dt.timetuple()) // 3600
+
+
+def _local_hours(seconds, tz):
+    """Map UTC epoch seconds to local wall-clock hour indexes.
+
+    Offsets are looked up once per distinct UTC hour rather than per order,
+    which also keeps DST changes inside the history correct.
+    """
+    utc_hours, inverse = np.unique(seconds // 3600, return_inverse=True)
+    offsets = np.fromiter((_utc_offset(int(h), tz) for h in utc_hours), dtype=np.int64, count=len(utc_hours))
+    return (seconds + offsets[inverse]) // 3600
+
+
+def _utc_offset(utc_hour, tz):
+    local = datetime.fromtimestamp(utc_hour * 3600, timezone.utc).astimezone(tz)
+    return int(local.utcoffset().total_seconds())
+
+
+def _week_start(hour):
+    # 1970-01-01 was a Thursday; step back to the Monday on or before `hour`.
+    day = hour // 24
+    return (day - (day + 3) % 7) * 24
+
+
+class DemandForecaster:
+    """Cached item x hour demand matrix with incremental refresh."""
+
+    def __init__(self, tz=None, half_life_weeks=HALF_LIFE_WEEKS):
+        # tz is an IANA name like "Europe/London"; None uses the server's zone.
+        self.tz_name = tz or ""
+        self.tz = ZoneInfo(tz) if tz else None
+        self.half_life_weeks = half_life_weeks
+        self.items = []            # row index -> item name
+        self.item_index = {}       # item name -> row index
+        self.start_hour = None     # local hour index of column 0 (a Monday 00:00)
+        self.demand = np.zeros((0, 0), dtype=np.float32)
+        self.last_order_id = 0
+        self.ready = False         # set once the history has been loaded
+        self._forecasts = {}
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        self.items = []
+        self.item_index = {}
+        self.start_hour = None
+        self.demand = np.zeros((0, 0), dtype=np.float32)
+        self.last_order_id = 0
+        self._forecasts.clear()
+
+    # ---------- Snapshot ----------
+    # Extracting years of Order.items JSON takes seconds, so the matrix is
+    # saved to disk and a restart only has to read orders added since.
+    def save(self, path):
+        """Atomically write the matrix and its metadata to `path` (.npz)."""
+        with self._lock:
+            # A per-process temp file, so two processes saving at once (e.g.
+            # under the reloader) can't interleave writes into one file.
+            tmp = tempfile.NamedTemporaryFile(
+                dir=os.path.dirname(path) or ".",
+                prefix=os.path.basename(path) + ".",
+                suffix=".tmp",
+                delete=False,
+            )
+            try:
+                with tmp:
+                    np.savez_compressed(
+                        tmp,
+                        demand=self.demand,
+                        items=np.array(self.items, dtype=str),
+                        start_hour=np.int64(-1 if self.start_hour is None else self.start_hour),
+                        last_order_id=np.int64(self.last_order_id),
+                        tz=np.array(self.tz_name),
+                    )
+                os.replace(tmp.name, path)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.remove(tmp.name)
+                raise
+
+    def load(self, path):
+        """Restore a snapshot from `path`; returns False if missing or stale.
+
+        A truncated or old-format snapshot is deleted so the next save
+        replaces it.
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["tz"]) != self.tz_name:
+                    return False
+                demand = data["demand"]
+                items = [str(name) for name in data["items"]]
+                start_hour = int(data["start_hour"])
+                last_order_id = int(data["last_order_id"])
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            return False
+
+        with self._lock:
+            self._reset()
+            self.demand = demand
+            self.items = items
+            self.item_index = {name: i for i, name in enumerate(items)}
+            self.start_hour = None if start_hour < 0 else start_hour
+            self.last_order_id = last_order_id
+        return True
+
+    # ---------- Loading ----------
+    def refresh(self, session):
+        """Fold orders newer than the last refresh into the matrix.
+
+        Returns the number of order lines that were added.
+        """
+        with self._lock:
+            max_id = session.execute(text('SELECT max(id) FROM "order"')).scalar() or 0
+            if max_id < self.last_order_id:
+                # Orders table was reset or replaced; the snapshot is stale.
+                self._reset()
+            if max_id <= self.last_order_id:
+                self.ready = True
+                return 0
+
+            params = {"last_id": self.last_order_id, "max_id": max_id}
+            rows = session.execute(text(ORDER_ITEMS_SQL), params).fetchall()
+            if rows:
+                seconds, names, quantities = zip(*rows)
+                hours = _local_hours(np.asarray(seconds, dtype=np.int64), self.tz)
+                quantities = np.asarray(quantities, dtype=np.float32)
+
+                # Factorize through the dict; sorting an object array is far slower.
+                new_items = sorted(set(names).difference(self.item_index))
+                item_index = dict(self.item_index)
+                item_index.update((name, len(self.items) + i) for i, name in enumerate(new_items))
+                item_rows = np.fromiter(map(item_index.__getitem__, names), dtype=np.int64, count=len(names))
+
+                demand, start_hour = self._grown(len(item_index), int(hours.min()), int(hours.max()))
+                np.add.at(demand, (item_rows, hours - start_hour), quantities)
+
+                # Only commit once the rows are in the matrix; otherwise a failure
+                # above would advance last_order_id and lose these orders for good.
+                self.demand, self.start_hour = demand, start_hour
+                self.items.extend(new_items)
+                self.item_index = item_index
+                self._forecasts.clear()
+
+            self.last_order_id = max_id
+            self.ready = True
+            return len(rows)
+
+    def _grown(self, n_items, first_hour, last_hour):
+        """Matrix and start hour covering n_items and [first_hour, last_hour].
+
+        Returns the current matrix when it already fits, otherwise a resized
+        copy; self is not modified.
+        """
+        new_start = _week_start(first_hour)
+        if self.start_hour is not None:
+            new_start = min(new_start, self.start_hour)
+        old_start = self.start_hour if self.start_hour is not None else new_start
+
+        end = max(last_hour + 1, old_start + self.demand.shape[1])
+        weeks = -(-(end - new_start) // HOURS_PER_WEEK)
+        shape = (n_items, weeks * HOURS_PER_WEEK)
+        if shape == self.demand.shape and new_start == old_start:
+            return self.demand, new_start
+
+        grown = np.zeros(shape, dtype=np.float32)
+        offset = old_start - new_start
+        rows, hours = self.demand.shape
+        grown[:rows, offset:offset + hours] = self.demand
+        return grown, new_start
+
+    # ---------- Forecasting ----------
+    def local_now(self):
+        """Current local wall-clock time as a naive datetime."""
+        return datetime.now(timezone.utc).astimezone(self.tz).replace(tzinfo=None)
+
+    def forecast_day(self, day, now=None):
+        """Return (items, hourly (n_items, 24) array) forecast for a local date.
+
+        `now` is a naive local datetime; only weeks finished by then are used.
+        """
+        now = now or self.local_now()
+        with self._lock:
+            if self.start_hour is None:
+                return [], np.zeros((0, 24), dtype=np.float32)
+
+            complete_weeks = min(
+                (_hour_index(now) - self.start_hour) // HOURS_PER_WEEK,
+                self.demand.shape[1] // HOURS_PER_WEEK,
+            )
+            key = (day, complete_weeks)
+            if key not in self._forecasts:
+                self._forecasts[key] = self._forecast(day, complete_weeks)
+            return list(self.items), self._forecasts[key]
+
+    def _forecast(self, day, complete_weeks):
+        n_items = len(self.items)
+        if complete_weeks <= 0:
+            return np.zeros((n_items, 24), dtype=np.float32)
+
+        weeks = self.demand[:, :complete_weeks * HOURS_PER_WEEK].reshape(n_items, complete_weeks, HOURS_PER_WEEK)
+
+        # Day-of-week / hour-of-day profile, recent weeks weighted highest.
+        age = np.arange(complete_weeks - 1, -1, -1, dtype=np.float32)
+        weights = 0.5 ** (age / self.half_life_weeks)
+        profile = np.einsum("w,iws->is", weights, weeks) / weights.sum()
+
+        day_hour = _hour_index(datetime(day.year, day.month, day.day))
+        slot = (day_hour - _week_start(day_hour)) // 24 * 24
+        hourly = profile[:, slot:slot + 24]
+
+        return hourly * self._seasonal_factor(weeks, day_hour)[:, None]
+
+    def _seasonal_factor(self, weeks, day_hour):
+        """Year-over-year change from the lead-up weeks to the target week."""
+        n_items, complete_weeks, _ = weeks.shape
+        factor = np.ones(n_items, dtype=np.float32)
+
+        target_week = (day_hour - self.start_hour) // HOURS_PER_WEEK - 52
+        baseline_end = complete_weeks - 52
+        baseline_start = baseline_end - BASELINE_WEEKS
+        if baseline_start < 0 or not baseline_end <= target_week < complete_weeks:
+            return factor
+
+        weekly_totals = weeks.sum(axis=2)
+        baseline = weekly_totals[:, baseline_start:baseline_end].mean(axis=1)
+        target = weekly_totals[:, target_week]
+        factor = (target + SEASONAL_SMOOTHING) / (baseline + SEASONAL_SMOOTHING)
+        return np.clip(factor, *SEASONAL_CLIP)
+
+    def prep_list(self, session, day=None, now=None):
+        """Refresh from new orders and return the prep list for `day` (local)."""
+        now = now or self.local_now()
+        day = day or (now + timedelta(days=1)).date()
+        self.refresh(session)
+        items, hourly = self.forecast_day(day, now=now)
+
+        totals = hourly.sum(axis=1)
+        order = np.argsort(-totals, kind="stable")
+        return {
+            "date": day.isoformat(),
+            "items": [
+                {
+                    "name": items[i],
+                    "prep": math.ceil(round(float(totals[i]), 2)),
+                    "forecast": round(float(totals[i]), 2),
+                    "hourly": [round(float(v), 2) for v in hourly[i]],
+                }
+                for i in order
+                if totals[i] > 0
+            ],
+        }
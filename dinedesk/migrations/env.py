@@ -1,10 +1,13 @@
 import logging
+import warnings
 from logging.config import fileConfig
 
 from flask import current_app
 
 from alembic import context
 
+from search import is_search_object
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -45,6 +48,22 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+def include_name(name, type_, parent_names):
+    # The search tables and indexes are managed by hand in their migration;
+    # skip them so autogenerate doesn't emit drops for objects it can't model.
+    return not is_search_object(name, type_)
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return not is_search_object(name, type_)
+
+
+# SQLAlchemy can't reflect ix_order_phone_key and warns before the filters run.
+warnings.filterwarnings(
+    "ignore", message="Skipped unsupported reflection of expression-based index ix_order_phone_key"
+)
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -65,7 +84,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_name=include_name, include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +113,8 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_name", include_name)
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
@@ -0,0 +1,56 @@
+"""Add FTS5 search index for reservations and orders
+
+Revision ID: 3b9e0d7a51c2
+Revises: f6c4c70df337
+Create Date: 2026-10-19 10:12:37.418203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from search import search_backfill_sql, search_schema_sql
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9e0d7a51c2'
+down_revision = 'f6c4c70df337'
+branch_labels = None
+depends_on = None
+
+
+TRIGGERS = (
+    'reservation_fts_ai', 'reservation_fts_au', 'reservation_fts_ad',
+    'order_fts_ai', 'order_fts_au', 'order_fts_ad',
+)
+INDEXES = (
+    'ix_order_email_nocase', 'ix_order_phone_key', 'ix_reservation_email_nocase',
+)
+TABLES = ('reservation_fts', 'order_fts')
+
+
+def _drop_all():
+    for name in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+    for name in INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+    for name in TABLES:
+        op.execute(f'DROP TABLE IF EXISTS {name}')
+
+
+def upgrade():
+    # App startup may already have created these objects, possibly with an
+    # older phone format on early builds; recreate them from scratch.
+    _drop_all()
+    op.execute('DROP INDEX IF EXISTS ix_order_phone_digits')
+    op.execute('DROP INDEX IF EXISTS ix_order_customer_name_nocase')
+    op.execute('DROP INDEX IF EXISTS ix_reservation_name_nocase')
+
+    # The app also runs this DDL at startup; sharing it keeps the two in step.
+    for stmt in search_schema_sql():
+        op.execute(stmt)
+    for stmt in search_backfill_sql():
+        op.execute(stmt)
+
+
+def downgrade():
+    _drop_all()
@@ -0,0 +1,376 @@
+import json
+import re
+import unicodedata
+
+from sqlalchemy import text
+
+
+# ================================
+# FULL-TEXT SEARCH (SQLite FTS5)
+# ================================
+# Reservations and orders each get an FTS5 shadow table keyed by the source
+# row id. Triggers on the source tables keep them in sync inside the same
+# transaction, so anything committed through db.session is searchable at once.
+# The schema is created at startup (the app builds its tables with
+# db.create_all) and by migration 3b9e0d7a51c2, both from search_schema_sql.
+# prefix='2 3' adds prefix indexes so short typeahead queries stay cheap.
+
+MIN_QUERY_LENGTH = 2
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+# Phones are compared on their last 10 digits, so "+1 (555) 123-4567",
+# "1-555-123-4567" and "555 123 4567" are one number whatever country code or
+# trunk prefix was typed. The FTS phone column holds both the full digits and
+# that canonical form, so a prefix of either one finds the row.
+PHONE_DIGITS = 10
+
+
+def phone_digits_sql(column):
+    """SQL expression stripping the usual phone punctuation from a column."""
+    expr = column
+    for ch in ("-", " ", "(", ")", "+", "."):
+        expr = f"replace({expr}, '{ch}', '')"
+    return expr
+
+
+def phone_key_sql(column):
+    """SQL expression for the canonical (last 10 digits) form of a phone column.
+
+    Must stay identical to ix_order_phone_key or SQLite won't use the index.
+    """
+    return f"substr({phone_digits_sql(column)}, -{PHONE_DIGITS})"
+
+
+def phone_fts_sql(column):
+    """SQL expression for the FTS phone column: full digits plus canonical form."""
+    return f"{phone_digits_sql(column)} || ' ' || {phone_key_sql(column)}"
+
+
+def phone_key(phone):
+    """Python counterpart of phone_key_sql for user input."""
+    return re.sub(r"\D", "", phone or "")[-PHONE_DIGITS:]
+
+
+# Alembic can't model FTS5 tables or expression indexes, so migrations/env.py
+# skips these when autogenerating instead of emitting drops for them.
+SEARCH_TABLE_RE = re.compile(r"^(reservation|order)_fts(_(data|idx|content|docsize|config))?$")
+SEARCH_INDEXES = {"ix_order_email_nocase", "ix_order_phone_key", "ix_reservation_email_nocase"}
+
+
+def is_search_object(name, type_):
+    """True for the FTS tables and lookup indexes owned by the search migration."""
+    if type_ == "table":
+        return bool(SEARCH_TABLE_RE.match(name or ""))
+    if type_ == "index":
+        return name in SEARCH_INDEXES
+    return False
+
+
+def search_schema_sql():
+    """Idempotent DDL for the FTS tables, sync triggers and lookup indexes."""
+    new_phone = phone_fts_sql("new.phone")
+    return [
+        # ---------- Reservations ----------
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS reservation_fts USING fts5(
+            name, email, notes,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS reservation_fts_ai AFTER INSERT ON reservation BEGIN
+            INSERT INTO reservation_fts (rowid, name, email, notes)
+            VALUES (new.id, new.name, new.email, new.notes);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS reservation_fts_au AFTER UPDATE ON reservation BEGIN
+            DELETE FROM reservation_fts WHERE rowid = old.id;
+            INSERT INTO reservation_fts (rowid, name, email, notes)
+            VALUES (new.id, new.name, new.email, new.notes);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS reservation_fts_ad AFTER DELETE ON reservation BEGIN
+            DELETE FROM reservation_fts WHERE rowid = old.id;
+        END
+        """,
+
+        # ---------- Orders ----------
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS order_fts USING fts5(
+            customer_name, email, phone, notes,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS order_fts_ai AFTER INSERT ON "order" BEGIN
+            INSERT INTO order_fts (rowid, customer_name, email, phone, notes)
+            VALUES (new.id, new.customer_name, new.email, {new_phone}, new.notes);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS order_fts_au AFTER UPDATE OF customer_name, email, phone, notes ON "order" BEGIN
+            DELETE FROM order_fts WHERE rowid = old.id;
+            INSERT INTO order_fts (rowid, customer_name, email, phone, notes)
+            VALUES (new.id, new.customer_name, new.email, {new_phone}, new.notes);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS order_fts_ad AFTER DELETE ON "order" BEGIN
+            DELETE FROM order_fts WHERE rowid = old.id;
+        END
+        """,
+
+        # ---------- Customer history lookups ----------
+        'CREATE INDEX IF NOT EXISTS ix_order_email_nocase ON "order" (email COLLATE NOCASE)',
+        f'CREATE INDEX IF NOT EXISTS ix_order_phone_key ON "order" ({phone_key_sql("phone")})',
+        "CREATE INDEX IF NOT EXISTS ix_reservation_email_nocase ON reservation (email COLLATE NOCASE)",
+    ]
+
+
+def search_backfill_sql():
+    """Copy rows the FTS tables are missing; cheap enough for every startup."""
+    return [
+        """
+        INSERT INTO reservation_fts (rowid, name, email, notes)
+        SELECT id, name, email, notes FROM reservation
+        WHERE id > (SELECT coalesce(max(rowid), 0) FROM reservation_fts)
+        """,
+        f"""
+        INSERT INTO order_fts (rowid, customer_name, email, phone, notes)
+        SELECT id, customer_name, email, {phone_fts_sql("phone")}, notes FROM "order"
+        WHERE id > (SELECT coalesce(max(rowid), 0) FROM order_fts)
+        """,
+    ]
+
+
+def init_search(db):
+    """Create any missing search schema, then index rows the FTS tables lack."""
+    with db.engine.begin() as conn:
+        for stmt in search_schema_sql():
+            conn.execute(text(stmt))
+        for stmt in search_backfill_sql():
+            conn.execute(text(stmt))
+
+
+def rebuild_search(db):
+    """Drop and repopulate both FTS indexes from the source tables."""
+    with db.engine.begin() as conn:
+        conn.execute(text("DELETE FROM reservation_fts"))
+        conn.execute(text("DELETE FROM order_fts"))
+        for stmt in search_backfill_sql():
+            conn.execute(text(stmt))
+        conn.execute(text("INSERT INTO reservation_fts (reservation_fts) VALUES ('optimize')"))
+        conn.execute(text("INSERT INTO order_fts (order_fts) VALUES ('optimize')"))
+
+
+# ================================
+# QUERIES
+# ================================
+_PHONE_RE = re.compile(r"^[\d\s()+.-]+$")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# E.164 country codes are prefix-free: 1 and 7 are one digit, these are two,
+# and every other code is three.
+_TWO_DIGIT_COUNTRY_CODES = frozenset(
+    "20 27 30 31 32 33 34 36 39 40 41 43 44 45 46 47 48 49 51 52 53 54 55 56 "
+    "57 58 60 61 62 63 64 65 66 81 82 84 86 90 91 92 93 94 95 98".split()
+)
+
+
+def _country_code_length(digits):
+    if digits[:1] in ("1", "7"):
+        return 1
+    if digits[:2] in _TWO_DIGIT_COUNTRY_CODES:
+        return 2
+    return 3
+
+
+def build_match(q):
+    """Turn free text into an FTS5 prefix query, or None if nothing usable.
+
+    Every term must match (implicit AND) and each term is a prefix so
+    results narrow as the host types. Phone-looking input is collapsed to
+    digits to line up with how phone numbers are indexed (see PHONE_DIGITS).
+    """
+    q = (q or "").strip()
+    if len(q) < MIN_QUERY_LENGTH:
+        return None
+
+    if _PHONE_RE.match(q):
+        digits = re.sub(r"\D", "", q)
+        if len(digits) < MIN_QUERY_LENGTH:
+            return None
+        terms = [digits]
+        if q.startswith("+"):
+            # Typed with a country code: also try the national number, so a
+            # partial "+1 555 123" still finds guests saved as "555-123...".
+            national = digits[_country_code_length(digits):]
+            if len(national) >= MIN_QUERY_LENGTH:
+                terms.append(national)
+        if len(digits) > PHONE_DIGITS:
+            terms.append(phone_key(digits))
+        return " OR ".join(f'"{t}"*' for t in dict.fromkeys(terms))
+
+    tokens = _TOKEN_RE.findall(q)
+    if not tokens:
+        return None
+    # Quoting each token keeps FTS5 operators (AND, NEAR, col:) in user input literal.
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def clamp_limit(limit):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+
+# Results are newest-first by rowid rather than bm25 rank: FTS5 can walk
+# the rowid order and stop at LIMIT, while ranking scores every match.
+RESERVATION_SEARCH_SQL = """
+    SELECT r.id, r.name, r.email, r.date, r.time, r.guests, r.notes
+    FROM reservation_fts
+    JOIN reservation r ON r.id = reservation_fts.rowid
+    WHERE reservation_fts MATCH :match
+    ORDER BY reservation_fts.rowid DESC
+    LIMIT :limit
+"""
+
+ORDER_SEARCH_SQL = """
+    SELECT o.id, o.customer_name, o.phone, o.email, o.total, o.status, o.timestamp
+    FROM order_fts
+    JOIN "order" o ON o.id = order_fts.rowid
+    WHERE order_fts MATCH :match
+    ORDER BY order_fts.rowid DESC
+    LIMIT :limit
+"""
+
+
+def search(session, q, limit=DEFAULT_LIMIT):
+    """Typeahead search across reservations and orders, most recent first."""
+    match = build_match(q)
+    if match is None:
+        return {"reservations": [], "orders": []}
+
+    params = {"match": match, "limit": clamp_limit(limit)}
+    reservations = session.execute(text(RESERVATION_SEARCH_SQL), params).mappings().all()
+    orders = session.execute(text(ORDER_SEARCH_SQL), params).mappings().all()
+
+    return {
+        "reservations": [dict(r) for r in reservations],
+        "orders": [dict(o) for o in orders],
+    }
+
+
+# ================================
+# CUSTOMER HISTORY
+# ================================
+# The app has no customer table, so a customer is whoever matches the given
+# email, phone or name. Email and phone use the indexes above; names go
+# through the FTS index so they fold case and accents the same way typeahead
+# does ("jose alvarez" is also "José Álvarez").
+
+def _fold(value):
+    """Tokens of `value`, casefolded with accents removed like the FTS tokenizer."""
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(value.casefold())
+
+
+def _name_ids(session, table, column, name):
+    """Row ids whose `column` is exactly `name` after folding."""
+    tokens = _fold(name)
+    # Anchored phrase match narrows to names starting with these tokens;
+    # the fold comparison drops longer names like "Jose Alvarez Jr".
+    match = f"{column} : ^ " + " + ".join(f'"{t}"' for t in tokens)
+    rows = session.execute(
+        text(f"SELECT rowid, {column} FROM {table} WHERE {table} MATCH :match"),
+        {"match": match},
+    ).all()
+    return [rowid for rowid, value in rows if _fold(value) == tokens]
+
+
+def _customer_filter(session, email, phone, name):
+    if email:
+        key = email.strip()
+        where = "email = :key COLLATE NOCASE"
+        return (where, where, {"key": key}, key)
+    if phone:
+        key = phone_key(phone)
+        if key:
+            # Reservations don't record a phone number.
+            return (f"{phone_key_sql('phone')} = :key", None, {"key": key}, key)
+    if name and _fold(name):
+        params = {
+            "order_ids": json.dumps(_name_ids(session, "order_fts", "customer_name", name)),
+            "reservation_ids": json.dumps(_name_ids(session, "reservation_fts", "name", name)),
+        }
+        return (
+            "id IN (SELECT value FROM json_each(:order_ids))",
+            "id IN (SELECT value FROM json_each(:reservation_ids))",
+            params,
+            name.strip(),
+        )
+    return None
+
+
+def customer_history(session, email=None, phone=None, name=None, recent=10):
+    """Aggregate visits and spend for one customer, or None if no key was given."""
+    f = _customer_filter(session, email, phone, name)
+    if f is None:
+        return None
+    order_where, reservation_where, params, key = f
+
+    spend = session.execute(text(f"""
+        SELECT count(*) AS orders,
+               coalesce(sum(total), 0) AS total_spend,
+               coalesce(avg(total), 0) AS average_spend,
+               min(timestamp) AS first_order,
+               max(timestamp) AS last_order
+        FROM "order" WHERE {order_where}
+    """), params).mappings().one()
+
+    recent_orders = session.execute(text(f"""
+        SELECT id, customer_name, total, items, order_type, status, timestamp
+        FROM "order" WHERE {order_where}
+        ORDER BY timestamp DESC
+        LIMIT :recent
+    """), {**params, "recent": recent}).mappings().all()
+
+    visits = {"reservations": 0, "guests": 0, "first_visit": None, "last_visit": None}
+    recent_reservations = []
+    if reservation_where:
+        visits = dict(session.execute(text(f"""
+            SELECT count(*) AS reservations,
+                   coalesce(sum(guests), 0) AS guests,
+                   min(date) AS first_visit,
+                   max(date) AS last_visit
+            FROM reservation WHERE {reservation_where}
+        """), params).mappings().one())
+
+        recent_reservations = session.execute(text(f"""
+            SELECT id, name, date, time, guests, notes
+            FROM reservation WHERE {reservation_where}
+            ORDER BY date DESC, time DESC
+            LIMIT :recent
+        """), {**params, "recent": recent}).mappings().all()
+
+    return {
+        "key": key,
+        "orders": spend["orders"],
+        "total_spend": round(spend["total_spend"], 2),
+        "average_spend": round(spend["average_spend"], 2),
+        "first_order": spend["first_order"],
+        "last_order": spend["last_order"],
+        "reservations": visits["reservations"],
+        "guests": visits["guests"],
+        "first_visit": visits["first_visit"],
+        "last_visit": visits["last_visit"],
+        "recent_orders": [dict(o) for o in recent_orders],
+        "recent_reservations": [dict(r) for r in recent_reservations],
+    }
@@ -0,0 +1,90 @@
+import json
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from forecast import DemandForecaster
+
+
+def make_db(orders):
+    engine = create_engine("sqlite://")
+    conn = engine.connect()
+    conn.execute(text('CREATE TABLE "order" (id INTEGER PRIMARY KEY, items TEXT, timestamp DATETIME)'))
+    for items, timestamp in orders:
+        conn.execute(
+            text('INSERT INTO "order" (items, timestamp) VALUES (:items, :timestamp)'),
+            {"items": items, "timestamp": timestamp},
+        )
+    return conn
+
+
+def test_non_object_items_are_skipped():
+    # Regression: a bare string in Order.items made json_extract raise and
+    # broke every later refresh.
+    conn = make_db([
+        ('["Pizza", 3, null, [1]]', "2026-01-05 12:00:00"),
+        (json.dumps([{"name": "Burger", "quantity": 2}, "Fries"]), "2026-01-05 12:30:00"),
+    ])
+    forecaster = DemandForecaster("UTC")
+
+    assert forecaster.refresh(conn) == 1
+    assert forecaster.items == ["Burger"]
+    assert forecaster.demand.sum() == 2
+    assert forecaster.last_order_id == 2
+
+
+def test_prep_list_uses_weekday_history():
+    # Two past Mondays of lunch orders forecast the next Monday.
+    conn = make_db([
+        (json.dumps([{"name": "Burger", "quantity": 3}]), "2026-01-05 12:10:00"),
+        (json.dumps([{"name": "Burger", "quantity": 3}]), "2026-01-12 12:10:00"),
+    ])
+    forecaster = DemandForecaster("UTC")
+
+    result = forecaster.prep_list(conn, date(2026, 1, 19), now=datetime(2026, 1, 19))
+
+    burger = result["items"][0]
+    assert burger["name"] == "Burger"
+    assert burger["prep"] == 3
+    assert burger["hourly"][12] == 3
+
+
+def test_corrupt_snapshot_is_discarded(tmp_path):
+    path = tmp_path / "forecast_cache.npz"
+    path.write_bytes(b"PK\x03\x04 truncated")
+
+    assert DemandForecaster("UTC").load(str(path)) is False
+    assert not path.exists()
+
+
+def test_snapshot_round_trip(tmp_path):
+    conn = make_db([(json.dumps([{"name": "Burger", "quantity": 2}]), "2026-01-05 12:00:00")])
+    path = str(tmp_path / "forecast_cache.npz")
+    saved = DemandForecaster("UTC")
+    saved.refresh(conn)
+    saved.save(path)
+
+    restored = DemandForecaster("UTC")
+    assert restored.load(path) is True
+    assert restored.items == ["Burger"]
+    assert restored.last_order_id == 1
+    assert DemandForecaster("Europe/London").load(path) is False
+
+
+def test_failed_refresh_does_not_skip_orders(monkeypatch):
+    conn = make_db([(json.dumps([{"name": "Burger", "quantity": 2}]), "2026-01-05 12:00:00")])
+    forecaster = DemandForecaster("UTC")
+
+    def boom(*args):
+        raise RuntimeError("bucketing failed")
+
+    monkeypatch.setattr("forecast._local_hours", boom)
+    with pytest.raises(RuntimeError):
+        forecaster.refresh(conn)
+    assert forecaster.last_order_id == 0
+    assert not forecaster.ready
+
+    monkeypatch.undo()
+    assert forecaster.refresh(conn) == 1
+    assert forecaster.demand.sum() == 2